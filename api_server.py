@@ -1,14 +1,33 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import Response
+from pydantic import BaseModel, Field
+import marisa_trie
+import orjson
 import uvicorn
 import os
+from functools import lru_cache
 from typing import List, Dict, Any, Optional
 
-# 相対インポート用の設定
-import sys
-sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+# 韻律辞書ファイル（build_rhyme_dict.py で生成）
+RHYMES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rhymes.dat")
+
+# 本番環境ではアクセスログと API ドキュメント UI（Swagger UI / ReDoc）を無効化
+PROD = os.environ.get("ENV") == "production"
+
+_VOWELS = frozenset("あいうえお")
+
+_LYRIC_TEMPLATES = (
+    "{t}への道のり、心に刻む",
+    "困難を乗り越え、{t}を見つめ",
+    "夢と現実、{t}が導く",
+    "前進あるのみ、{t}とともに",
+    "光差す未来、{t}を信じて",
+    "歩み続ける、{t}の力で",
+    "希望の歌声、{t}響かせ",
+    "新たな明日、{t}と歩もう"
+)
 
 # 軽量版の実装（重い依存関係を避ける）
 class RhymeSearchGPT:
@@ -16,20 +35,17 @@ class RhymeSearchGPT:
         self.api_key = os.environ.get("OPENAI_API_KEY")
         print(f"OpenAI API Key configured: {'Yes' if self.api_key else 'No'}")
         
-        # 基本的な韻律辞書
-        self.sample_rhymes = {
-            "愛": ["開", "海", "貝", "回", "会", "買", "台", "態", "代"],
-            "夢": ["雲", "組", "込", "積", "詰", "摘", "潜"],
-            "光": ["理", "利", "力", "切", "着", "勝", "立"],
-            "心": ["信", "新", "真", "進", "親", "針", "芯"],
-            "歌": ["花", "香", "菓", "話", "価", "華", "化"],
-            "希望": ["未来", "期待", "願い", "目標", "夢想", "理想"],
-            "桜": ["花", "春", "美", "優", "香", "雅"]
-        }
+        # 韻律辞書（build_rhyme_dict.py で生成した MARISA-trie）
+        if not os.path.exists(RHYMES_PATH):
+            raise RuntimeError(f"{RHYMES_PATH} が見つかりません。python build_rhyme_dict.py で生成してください")
+        self.trie = marisa_trie.BytesTrie()
+        # mmap で読み込み、複数ワーカー間で OS のページキャッシュを共有する
+        self.trie.mmap(RHYMES_PATH)
     
     def search_rhymes_for_gpt(self, word: str, max_results: int = 10, phonetic_similarity: float = 0.7) -> Dict[str, Any]:
         """韻律検索機能"""
-        rhymes = self.sample_rhymes.get(word, [f"{word}音", f"{word}韻", "類似"])[:max_results]
+        vals = self.trie.get(word)
+        rhymes = (orjson.loads(vals[0]) if vals else [f"{word}音", f"{word}韻", "類似"])[:max_results]
         
         return {
             "status": "success",
@@ -47,6 +63,8 @@ class RhymeSearchGPT:
     
     def analyze_phonetics_for_gpt(self, word: str, detailed: bool = True) -> Dict[str, Any]:
         """音韻分析機能"""
+        vowels = sum(1 for c in word if c in _VOWELS)
+        
         return {
             "status": "success",
             "word": word,
@@ -55,8 +73,8 @@ class RhymeSearchGPT:
             "vowel_pattern": "模擬パターン",
             "rhyme_class": f"{word}クラス",
             "phonetic_features": {
-                "consonants": len([c for c in word if c not in "あいうえお"]),
-                "vowels": len([c for c in word if c in "あいうえお"])
+                "consonants": len(word) - vowels,
+                "vowels": vowels
             }
         }
     
@@ -66,16 +84,7 @@ class RhymeSearchGPT:
         max_lines = kwargs.get("max_lines", 8)
         
         # テーマに基づいたラップ生成
-        lyrics = [
-            f"{theme}への道のり、心に刻む",
-            f"困難を乗り越え、{theme}を見つめ",
-            f"夢と現実、{theme}が導く", 
-            f"前進あるのみ、{theme}とともに",
-            f"光差す未来、{theme}を信じて",
-            f"歩み続ける、{theme}の力で",
-            f"希望の歌声、{theme}響かせ",
-            f"新たな明日、{theme}と歩もう"
-        ][:max_lines]
+        lyrics = [tpl.format(t=theme) for tpl in _LYRIC_TEMPLATES[:max_lines]]
         
         return {
             "status": "success",
@@ -95,16 +104,21 @@ app = FastAPI(
     title="Rhyme Search API for ChatGPT Custom GPT",
     description="ChatGPT Custom GPT用の韻律検索APIシステム",
     version="1.0.0",
-    docs_url="/docs",
-    openapi_url="/openapi.json"
+    docs_url=None if PROD else "/docs",
+    redoc_url=None if PROD else "/redoc",
+    openapi_url="/openapi.json"  # Custom GPT のアクション設定で参照するため本番でも公開
 )
 
+# レスポンス圧縮（日本語の UTF-8 JSON はマルチバイトで圧縮が効きやすい）
+app.add_middleware(GZipMiddleware, minimum_size=512)
+
 # CORS設定（ChatGPT Custom GPTからのアクセスを許可）
+# 後から追加したミドルウェアが外側になるため、プリフライトは GZip を通らずに応答する
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["https://chat.openai.com", "*"],  # 本番環境では適切に制限
+    allow_origins=["https://chat.openai.com", "https://chatgpt.com"],
     allow_credentials=True,
-    allow_methods=["GET", "POST", "PUT", "DELETE"],
+    allow_methods=["GET", "POST"],
     allow_headers=["*"],
 )
 
@@ -112,14 +126,28 @@ app.add_middleware(
 rhyme_gpt = RhymeSearchGPT()
 print("RhymeSearchGPT initialized successfully")
 
+# キャッシュされる word の最大長（リクエストモデルで検証）
+MAX_WORD_LENGTH = 64
+
+# 同じ入力には同じ結果を返すため、シリアライズ済みのバイト列をキャッシュする
+# （結果に影響しない phonetic_similarity / detailed はキーに含めない。
+#   エントリサイズは MAX_WORD_LENGTH で上限を設ける）
+@lru_cache(maxsize=4096)
+def _search_rhymes_bytes(word: str, max_results: Optional[int]) -> bytes:
+    return orjson.dumps(rhyme_gpt.search_rhymes_for_gpt(word=word, max_results=max_results))
+
+@lru_cache(maxsize=4096)
+def _analyze_phonetics_bytes(word: str) -> bytes:
+    return orjson.dumps(rhyme_gpt.analyze_phonetics_for_gpt(word=word))
+
 # リクエストモデル定義
 class RhymeSearchRequest(BaseModel):
-    word: str
+    word: str = Field(max_length=MAX_WORD_LENGTH)
     max_results: Optional[int] = 10
     phonetic_similarity: Optional[float] = 0.7
 
 class PhoneticAnalysisRequest(BaseModel):
-    word: str
+    word: str = Field(max_length=MAX_WORD_LENGTH)
     detailed: Optional[bool] = True
 
 class RapSuggestionRequest(BaseModel):
@@ -128,20 +156,43 @@ class RapSuggestionRequest(BaseModel):
     style: Optional[str] = "modern"
     max_lines: Optional[int] = 8
 
+# 固定レスポンスはインポート時に一度だけシリアライズ
+_ROOT_BYTES = orjson.dumps({
+    "message": "Rhyme Search API for ChatGPT Custom GPT",
+    "status": "active",
+    "version": "1.0.0",
+    "endpoints": {
+        "search_rhymes": "/api/search-rhymes",
+        "analyze_phonetics": "/api/analyze-phonetics",
+        "generate_rap": "/api/generate-rap-suggestions",
+        "openapi_schema": "/openapi.json"
+    }
+})
+_HEALTH_BYTES = orjson.dumps({"status": "healthy", "timestamp": "2024-01-01T00:00:00Z"})
+_API_HEALTH_BYTES = orjson.dumps({
+    "status": "healthy",
+    "service": "Rhyme Search API",
+    "version": "1.0.0",
+    "timestamp": "2024-01-01T00:00:00Z"
+})
+
+# ラップ生成失敗時のフォールバック応答（%(...)b には _json_str でエスケープした値を埋め込む）
+_RAP_ERROR_FALLBACK_TPL = (
+    '{"status":"error_fallback","theme":"%(theme)b","style":"%(style)b",'
+    '"lyrics":["%(theme)bの光、闇を照らす","困難越えて、%(theme)bへ向かう",'
+    '"信じる心、%(theme)bとともに","未来へ歩む、%(theme)bの道"],'
+    '"rhyme_analysis":{"pattern":"ABAB"},'
+    '"message":"サーバーエラーのため基本ラップを生成: %(error)b"}'
+).encode()
+
+def _json_str(value: str) -> bytes:
+    """JSON 文字列リテラルの中身（前後の引用符を除いたもの）を返す"""
+    return orjson.dumps(value)[1:-1]
+
 @app.get("/")
 async def root():
     """ヘルスチェックエンドポイント"""
-    return {
-        "message": "Rhyme Search API for ChatGPT Custom GPT",
-        "status": "active",
-        "version": "1.0.0",
-        "endpoints": {
-            "search_rhymes": "/api/search-rhymes",
-            "analyze_phonetics": "/api/analyze-phonetics", 
-            "generate_rap": "/api/generate-rap-suggestions",
-            "openapi_schema": "/openapi.json"
-        }
-    }
+    return Response(content=_ROOT_BYTES, media_type="application/json")
 
 @app.post("/api/search-rhymes")
 async def search_rhymes(request: RhymeSearchRequest):
@@ -149,29 +200,18 @@ async def search_rhymes(request: RhymeSearchRequest):
     指定した単語と韻を踏む単語を検索
     ChatGPT Custom GPT から使用されるメインエンドポイント
     """
-    try:
-        result = rhyme_gpt.search_rhymes_for_gpt(
-            word=request.word,
-            max_results=request.max_results,
-            phonetic_similarity=request.phonetic_similarity
-        )
-        return JSONResponse(content=result)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"韻律検索エラー: {str(e)}")
+    # 辞書を組み立てるだけで await も例外も発生しないため、
+    # スレッドプールを経由しない async def のまま try/except を省く
+    content = _search_rhymes_bytes(request.word, request.max_results)
+    return Response(content=content, media_type="application/json")
 
 @app.post("/api/analyze-phonetics")
 async def analyze_phonetics(request: PhoneticAnalysisRequest):
     """
     単語の音韻構造を詳細に分析
     """
-    try:
-        result = rhyme_gpt.analyze_phonetics_for_gpt(
-            word=request.word,
-            detailed=request.detailed
-        )
-        return JSONResponse(content=result)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"音韻分析エラー: {str(e)}")
+    content = _analyze_phonetics_bytes(request.word)
+    return Response(content=content, media_type="application/json")
 
 @app.post("/api/generate-rap-suggestions")
 async def generate_rap_suggestions(request: RapSuggestionRequest):
@@ -179,56 +219,32 @@ async def generate_rap_suggestions(request: RapSuggestionRequest):
     テーマに基づいてラップ歌詞を提案
     """
     try:
-        # より堅牢なエラーハンドリング
         result = rhyme_gpt.generate_rap_suggestions_for_gpt(
             theme=request.theme,
             rhyme_words=request.rhyme_words,
             style=request.style,
             max_lines=request.max_lines
         )
-        
-        # 成功レスポンスを保証
-        if not result:
-            result = {
-                "status": "fallback",
-                "theme": request.theme,
-                "lyrics": [f"{request.theme}への思い、心に響く"],
-                "message": "基本的なラップを生成しました"
-            }
-        
-        return JSONResponse(content=result, status_code=200)
-        
-    except Exception as e:
+    except (TypeError, ValueError) as e:
         # エラー時のフォールバック応答
-        fallback_result = {
-            "status": "error_fallback",
-            "theme": request.theme,
-            "style": request.style or "modern",
-            "lyrics": [
-                f"{request.theme}の光、闇を照らす",
-                f"困難越えて、{request.theme}へ向かう",
-                f"信じる心、{request.theme}とともに",
-                f"未来へ歩む、{request.theme}の道"
-            ],
-            "rhyme_analysis": {"pattern": "ABAB"},
-            "message": f"サーバーエラーのため基本ラップを生成: {str(e)}"
+        content = _RAP_ERROR_FALLBACK_TPL % {
+            b"theme": _json_str(request.theme),
+            b"style": _json_str(request.style or "modern"),
+            b"error": _json_str(str(e))
         }
-        return JSONResponse(content=fallback_result, status_code=200)
+        return Response(content=content, media_type="application/json")
+    
+    return Response(content=orjson.dumps(result), media_type="application/json")
 
 @app.get("/health")
 async def health_check():
     """ヘルスチェック（デプロイメント用）"""
-    return {"status": "healthy", "timestamp": "2024-01-01T00:00:00Z"}
+    return Response(content=_HEALTH_BYTES, media_type="application/json")
 
 @app.get("/api/health")
 async def api_health_check():
     """API ヘルスチェック（Railway用）"""
-    return {
-        "status": "healthy", 
-        "service": "Rhyme Search API",
-        "version": "1.0.0",
-        "timestamp": "2024-01-01T00:00:00Z"
-    }
+    return Response(content=_API_HEALTH_BYTES, media_type="application/json")
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8000))
@@ -237,6 +253,10 @@ if __name__ == "__main__":
         "api_server:app",
         host="0.0.0.0", 
         port=port,
+        # コンテナ内の os.cpu_count() はホストのコア数を返すため、既定値は固定にする
+        workers=int(os.environ.get("WEB_CONCURRENCY", 2)),
+        loop="uvloop",
+        http="httptools",
         reload=False,
-        access_log=True
+        access_log=not PROD
     )
@@ -0,0 +1,22 @@
+import os
+
+import marisa_trie
+import orjson
+
+# 基本的な韻律辞書（rhymes.dat の元データ）
+RHYMES = {
+    "愛": ["開", "海", "貝", "回", "会", "買", "台", "態", "代"],
+    "夢": ["雲", "組", "込", "積", "詰", "摘", "潜"],
+    "光": ["理", "利", "力", "切", "着", "勝", "立"],
+    "心": ["信", "新", "真", "進", "親", "針", "芯"],
+    "歌": ["花", "香", "菓", "話", "価", "華", "化"],
+    "希望": ["未来", "期待", "願い", "目標", "夢想", "理想"],
+    "桜": ["花", "春", "美", "優", "香", "雅"]
+}
+
+RHYMES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rhymes.dat")
+
+if __name__ == "__main__":
+    trie = marisa_trie.BytesTrie((word, orjson.dumps(rhymes)) for word, rhymes in RHYMES.items())
+    trie.save(RHYMES_PATH)
+    print(f"Saved {len(RHYMES)} entries to {RHYMES_PATH}")